@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from functools import lru_cache
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Settings:
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-5.1")
@@ -18,6 +18,8 @@ class Settings:
         "no",
     }
     stream_buffer_chars: int = int(os.getenv("STREAM_BUFFER_CHARS", "120"))
+    max_concurrent_jobs: int = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+    frontend_cache_seconds: int = int(os.getenv("FRONTEND_CACHE_SECONDS", "3600"))
 
 
 @lru_cache()
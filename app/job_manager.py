@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
 import shutil
 import uuid
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, TextIO, Tuple, Union
+
+import orjson
 
 
 class JobStatus(str):
@@ -16,6 +21,18 @@ class JobStatus(str):
     FAILED = "failed"
 
 
+# result.json 會直接提供下載，保留縮排；meta.json 僅供程式讀取，使用精簡格式
+_RESULT_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+
+def _dump_result(payload: Dict[str, object]) -> bytes:
+    try:
+        return orjson.dumps(payload, option=_RESULT_JSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # orjson 不支援超過 64 位元的整數（extensions 可能出現），退回標準庫
+        return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+
 def _utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -24,7 +41,7 @@ def _ts() -> str:
     return _utc_now().isoformat().replace("+00:00", "Z")
 
 
-@dataclass
+@dataclass(slots=True)
 class JobRecord:
     id: str
     provider: str
@@ -68,23 +85,66 @@ class JobManager:
         self.root = root or (base_dir / "tmp" / "jobs")
         self.keep_max = max(keep_max, 1)
         self.root.mkdir(parents=True, exist_ok=True)
+        # 熱路徑以字串組路徑，省去每次建立 Path 物件
+        self._root_str = os.fspath(self.root)
+        # job_id -> ((st_mtime_ns, st_size), JobRecord)；meta.json 未變動時免重新解析
+        self._meta_cache: OrderedDict[str, Tuple[Tuple[int, int], JobRecord]] = OrderedDict()
+        # 進行中任務的 stream.log 寫入 handle，任務結束時關閉
+        self._stream_handles: Dict[str, TextIO] = {}
+        # 進行中任務的 stream.log 唯讀 fd，供 SSE 輪詢以 pread 讀取
+        self._stream_read_fds: Dict[str, int] = {}
+        # SSE 等待者的喚醒事件；每次通知後換新，所有等待者都會被喚醒
+        self._stream_events: Dict[str, asyncio.Event] = {}
 
     # ---------- File helpers ----------
     def _job_dir(self, job_id: str) -> Path:
         return self.root / job_id
 
-    def _meta_path(self, job_id: str) -> Path:
-        return self._job_dir(job_id) / "meta.json"
+    def _job_file(self, job_id: str, filename: str) -> str:
+        return os.path.join(self._root_str, job_id, filename)
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self._root_str, job_id, "meta.json")
 
     def _read_meta(self, job_id: str) -> JobRecord:
+        return replace(self._load_meta(job_id))
+
+    def _load_meta(self, job_id: str) -> JobRecord:
+        """回傳快取中的 JobRecord（共用物件，呼叫端不可修改）。"""
         meta_path = self._meta_path(job_id)
-        data = json.loads(meta_path.read_text(encoding="utf-8"))
-        return JobRecord(**data)
+        try:
+            stat = os.stat(meta_path)
+        except FileNotFoundError:
+            self._meta_cache.pop(job_id, None)
+            raise
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._meta_cache.get(job_id)
+        if cached is not None and cached[0] == signature:
+            self._meta_cache.move_to_end(job_id)
+            return cached[1]
+        with open(meta_path, "rb") as handle:
+            data = orjson.loads(handle.read())
+        job = JobRecord(**data)
+        self._cache_meta(job, signature)
+        return job
 
     def _write_meta(self, job: JobRecord) -> None:
         job.updated_at = _ts()
         meta_path = self._meta_path(job.id)
-        meta_path.write_text(json.dumps(job.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        # 先寫暫存檔再 rename，讀取端不會看到寫到一半的 meta.json
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(orjson.dumps(job.to_dict()))
+        os.replace(tmp_path, meta_path)
+        stat = os.stat(meta_path)
+        self._cache_meta(replace(job), (stat.st_mtime_ns, stat.st_size))
+        self._notify_stream(job.id)  # 狀態變更也要喚醒 SSE 等待者
+
+    def _cache_meta(self, job: JobRecord, signature: Tuple[int, int]) -> None:
+        self._meta_cache[job.id] = (signature, job)
+        self._meta_cache.move_to_end(job.id)
+        while len(self._meta_cache) > self.keep_max * 2:
+            self._meta_cache.popitem(last=False)
 
     # ---------- Public helpers ----------
     def create_job(self, provider: str, payload: str, base_image: Optional[bytes] = None) -> JobRecord:
@@ -136,12 +196,45 @@ class JobManager:
     def append_stream(self, job_id: str, text: str) -> None:
         if not text:
             return
-        job = self._read_meta(job_id)
-        stream_path = self._job_dir(job_id) / job.stream_filename
-        with stream_path.open("a", encoding="utf-8") as handle:
-            handle.write(text)
-
-    def complete_job(
+        handle = self._stream_handles.get(job_id)
+        if handle is None:
+            job = self._load_meta(job_id)
+            handle = open(self._job_file(job_id, job.stream_filename), "a", encoding="utf-8")
+            self._stream_handles[job_id] = handle
+        handle.write(text)
+        handle.flush()  # 讓 SSE 讀取端立即看到新內容
+        self._notify_stream(job_id)
+
+    def stream_event(self, job_id: str) -> asyncio.Event:
+        """取得任務目前的串流事件；須在讀取串流前取得，讀取後才寫入的內容才不會漏接。"""
+        event = self._stream_events.get(job_id)
+        if event is None:
+            event = self._stream_events[job_id] = asyncio.Event()
+        return event
+
+    @staticmethod
+    async def wait_for_stream(event: asyncio.Event, timeout: float) -> None:
+        """等待新的串流內容或任務結束，逾時則直接返回。"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify_stream(self, job_id: str) -> None:
+        event = self._stream_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _close_stream(self, job_id: str) -> None:
+        handle = self._stream_handles.pop(job_id, None)
+        if handle is not None:
+            handle.close()
+        fd = self._stream_read_fds.pop(job_id, None)
+        if fd is not None:
+            os.close(fd)
+        self._notify_stream(job_id)
+
+    async def complete_job(
         self,
         job_id: str,
         raw_output: str,
@@ -154,63 +247,82 @@ class JobManager:
         job.completed_at = _ts()
         job.error = None
         job.token_usage = token_usage
-        raw_filename = "raw.txt"
-        result_filename = "result.json"
-        job.raw_filename = raw_filename
-        job.result_filename = result_filename
+        job.raw_filename = "raw.txt"
+        job.result_filename = "result.json"
         if png_bytes:
-            png_filename = "card.png"
-            (self._job_dir(job_id) / png_filename).write_bytes(png_bytes)
-            job.png_filename = png_filename
-        job_dir = self._job_dir(job_id)
-        (job_dir / raw_filename).write_text(raw_output, encoding="utf-8")
-        (job_dir / result_filename).write_text(
-            json.dumps(export_payload, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-        self._write_meta(job)
+            job.png_filename = "card.png"
+        try:
+            # 大型檔案寫入交給 thread，避免阻塞其他任務的串流
+            await asyncio.to_thread(self._write_completion_files, job, raw_output, export_payload, png_bytes)
+            # meta 最後寫入：讀取端看到 completed 時其他檔案已就緒
+            self._write_meta(job)
+        finally:
+            # 等待 thread 期間 SSE 仍可能以 running 狀態快取 fd，須在狀態確定後才關閉
+            self._close_stream(job_id)
         return job
 
+    def _write_completion_files(
+        self,
+        job: JobRecord,
+        raw_output: str,
+        export_payload: Dict[str, object],
+        png_bytes: Optional[bytes],
+    ) -> None:
+        job_dir = self._job_dir(job.id)
+        (job_dir / job.raw_filename).write_text(raw_output, encoding="utf-8")
+        (job_dir / job.result_filename).write_bytes(_dump_result(export_payload))
+        if png_bytes and job.png_filename:
+            (job_dir / job.png_filename).write_bytes(png_bytes)
+
     def fail_job(self, job_id: str, error: str) -> JobRecord:
         job = self._read_meta(job_id)
         job.status = JobStatus.FAILED
         job.completed_at = _ts()
         job.error = error
-        self._write_meta(job)
+        try:
+            self._write_meta(job)
+        finally:
+            self._close_stream(job_id)
         return job
 
     def read_input(self, job_id: str) -> str:
-        job = self._read_meta(job_id)
-        return (self._job_dir(job_id) / job.input_filename).read_text(encoding="utf-8")
+        return self._read_input_for(self._read_meta(job_id))
 
     def read_stream(self, job_id: str) -> Tuple[str, int]:
-        job = self._read_meta(job_id)
-        stream_path = self._job_dir(job_id) / job.stream_filename
-        if not stream_path.exists():
-            return "", 0
-        data = stream_path.read_text(encoding="utf-8")
-        return data, stream_path.stat().st_size
+        return self._read_stream_for(self._read_meta(job_id))
 
     def read_stream_chunk(self, job_id: str, offset: int) -> Tuple[str, int]:
-        job = self._read_meta(job_id)
-        stream_path = self._job_dir(job_id) / job.stream_filename
-        if not stream_path.exists():
+        job = self._load_meta(job_id)
+        fd = self._stream_read_fds.get(job_id)
+        if fd is not None:
+            return self._pread_stream(fd, offset)
+        stream_path = self._job_file(job_id, job.stream_filename)
+        try:
+            fd = os.open(stream_path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        except FileNotFoundError:
             return "", offset
-        with stream_path.open("rb") as handle:
-            handle.seek(offset)
-            chunk = handle.read()
-            new_offset = handle.tell()
+        if job_id in self._stream_handles:
+            # 僅快取本程序正在寫入的任務，任務結束時由 _close_stream 關閉；
+            # 其他程序遺留的 running 任務不會走到 _close_stream，改用一次性 fd
+            self._stream_read_fds[job_id] = fd
+            return self._pread_stream(fd, offset)
+        try:
+            return self._pread_stream(fd, offset)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _pread_stream(fd: int, offset: int) -> Tuple[str, int]:
+        size = os.fstat(fd).st_size
+        if size <= offset:
+            return "", offset
+        chunk = os.pread(fd, size - offset, offset)
         if not chunk:
             return "", offset
-        return chunk.decode("utf-8", errors="ignore"), new_offset
+        return chunk.decode("utf-8", errors="ignore"), offset + len(chunk)
 
     def read_result(self, job_id: str) -> Optional[Dict[str, object]]:
-        job = self._read_meta(job_id)
-        if not job.result_filename:
-            return None
-        result_path = self._job_dir(job_id) / job.result_filename
-        if not result_path.exists():
-            return None
-        return json.loads(result_path.read_text(encoding="utf-8"))
+        return self._read_result_for(self._read_meta(job_id))
 
     def result_file_path(self, job_id: str) -> Optional[Path]:
         job = self._read_meta(job_id)
@@ -222,13 +334,7 @@ class JobManager:
         return path
 
     def png_file_path(self, job_id: str) -> Optional[Path]:
-        job = self._read_meta(job_id)
-        if not job.png_filename:
-            return None
-        path = self._job_dir(job_id) / job.png_filename
-        if not path.exists():
-            return None
-        return path
+        return self._png_path_for(self._read_meta(job_id))
 
     def read_base_image(self, job_id: str) -> Optional[bytes]:
         job = self._read_meta(job_id)
@@ -240,69 +346,104 @@ class JobManager:
         return path.read_bytes()
 
     def read_raw(self, job_id: str) -> Optional[str]:
-        job = self._read_meta(job_id)
-        if not job.raw_filename:
-            return None
-        raw_path = self._job_dir(job_id) / job.raw_filename
-        if not raw_path.exists():
-            return None
-        return raw_path.read_text(encoding="utf-8")
+        return self._read_raw_for(self._read_meta(job_id))
 
-    def get_job_detail(self, job_id: str) -> Dict[str, object]:
+    def get_job_detail(self, job_id: str, include_stream: bool = True) -> Dict[str, object]:
+        """include_stream=False 時不讀取 stream.log 內容，僅回傳目前 offset。"""
         job = self._read_meta(job_id)
-        stream_text, stream_offset = self.read_stream(job_id)
-        input_text = self.read_input(job_id)
-        result = self.read_result(job_id)
-        raw = self.read_raw(job_id)
-        png_exists = self.png_file_path(job_id) is not None
+        if include_stream:
+            stream_text, stream_offset = self._read_stream_for(job)
+        else:
+            stream_text, stream_offset = None, self._stream_size_for(job)
         return {
             "meta": job.to_dict(),
-            "input_text": input_text,
+            "input_text": self._read_input_for(job),
             "stream_text": stream_text,
             "stream_offset": stream_offset,
-            "result": result,
-            "raw_output": raw,
-            "png_available": png_exists,
+            "result": self._read_result_for(job),
+            "raw_output": self._read_raw_for(job),
+            "png_available": self._png_path_for(job) is not None,
         }
 
+    # ---------- Per-record readers (meta 已載入) ----------
+    def _read_input_for(self, job: JobRecord) -> str:
+        with open(self._job_file(job.id, job.input_filename), encoding="utf-8") as handle:
+            return handle.read()
+
+    def _read_stream_for(self, job: JobRecord) -> Tuple[str, int]:
+        try:
+            with open(self._job_file(job.id, job.stream_filename), "rb") as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return "", 0
+        return data.decode("utf-8"), len(data)
+
+    def _stream_size_for(self, job: JobRecord) -> int:
+        try:
+            return os.stat(self._job_file(job.id, job.stream_filename)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _read_result_for(self, job: JobRecord) -> Optional[Dict[str, object]]:
+        if not job.result_filename:
+            return None
+        try:
+            with open(self._job_file(job.id, job.result_filename), "rb") as handle:
+                return orjson.loads(handle.read())
+        except FileNotFoundError:
+            return None
+
+    def _read_raw_for(self, job: JobRecord) -> Optional[str]:
+        if not job.raw_filename:
+            return None
+        try:
+            with open(self._job_file(job.id, job.raw_filename), encoding="utf-8") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def _png_path_for(self, job: JobRecord) -> Optional[Path]:
+        if not job.png_filename:
+            return None
+        path = self._job_file(job.id, job.png_filename)
+        if not os.path.exists(path):
+            return None
+        return Path(path)
+
     def list_jobs(self) -> Dict[str, List[Dict[str, object]]]:
-        metas: List[JobRecord] = []
-        for item in sorted(self.root.iterdir() if self.root.exists() else [], key=lambda p: p.name):
-            meta_path = item / "meta.json"
-            if not meta_path.exists():
-                continue
-            try:
-                data = json.loads(meta_path.read_text(encoding="utf-8"))
-                metas.append(JobRecord(**data))
-            except Exception:  # noqa: BLE001
-                continue
+        metas = self._scan_metas()
         metas.sort(key=lambda m: m.created_at, reverse=True)
         in_progress = [m.to_dict() for m in metas if m.status in {JobStatus.PENDING, JobStatus.RUNNING}]
         completed = [m.to_dict() for m in metas if m.status in {JobStatus.COMPLETED, JobStatus.FAILED}]
         return {"in_progress": in_progress, "completed": completed}
 
-    def _housekeep(self) -> None:
-        job_dirs = []
-        for path in self.root.iterdir():
-            meta_path = path / "meta.json"
-            if not meta_path.exists():
-                continue
+    def _scan_metas(self) -> List[JobRecord]:
+        if not self.root.exists():
+            return []
+        with os.scandir(self.root) as it:
+            job_ids = [entry.name for entry in it if entry.is_dir()]
+        metas: List[JobRecord] = []
+        for job_id in job_ids:
             try:
-                data = json.loads(meta_path.read_text(encoding="utf-8"))
-            except Exception:  # noqa: BLE001
-                continue
-            job_dirs.append((data.get("created_at", ""), data.get("status"), path))
+                metas.append(self._load_meta(job_id))
+            except (OSError, orjson.JSONDecodeError, TypeError):
+                continue  # 尚未寫入 meta 或格式不符的資料夾
+        return metas
 
-        if len(job_dirs) <= self.keep_max:
+    def _housekeep(self) -> None:
+        metas = self._scan_metas()
+        if len(metas) <= self.keep_max:
             return
 
-        job_dirs.sort(key=lambda item: item[0])  # oldest first
-        removable = [entry for entry in job_dirs if entry[1] in {JobStatus.COMPLETED, JobStatus.FAILED}]
+        metas.sort(key=lambda m: m.created_at)  # oldest first
+        removable = [m.id for m in metas if m.status in {JobStatus.COMPLETED, JobStatus.FAILED}]
 
-        total = len(job_dirs)
+        total = len(metas)
         idx = 0
         while total > self.keep_max and idx < len(removable):
-            _, _, target = removable[idx]
-            shutil.rmtree(target, ignore_errors=True)
+            target = removable[idx]
+            shutil.rmtree(self._job_dir(target), ignore_errors=True)
+            self._meta_cache.pop(target, None)
+            self._close_stream(target)
             total -= 1
             idx += 1
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-import json
+import io
 import logging
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable, Dict, List, Optional, Tuple, Union
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
 import httpx
+import orjson
 from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
@@ -15,11 +17,54 @@ from .prompts import build_system_prompt, build_user_prompt
 
 logger = logging.getLogger(__name__)
 
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncIterator[bytearray]:
+    """逐行切分 SSE 原始位元組，回傳每個 `data:` 欄位內容，遇到 [DONE] 即結束。"""
+    pending = bytearray()
+    async for raw in response.aiter_bytes():
+        pending += raw
+        start = 0
+        while (end := pending.find(b"\n", start)) != -1:
+            data = _sse_data(pending, start, end)
+            start = end + 1
+            if data is None:
+                continue
+            if data == b"[DONE]":
+                return
+            yield data
+        del pending[:start]
+    data = _sse_data(pending, 0, len(pending))
+    if data is not None and data != b"[DONE]":
+        yield data
+
+
+def _sse_data(buf: bytearray, start: int, stop: int) -> Optional[bytearray]:
+    """取出 buf[start:stop] 這一行的 data 內容；僅在最後切片一次，不建立中間物件。"""
+    if stop > start and buf[stop - 1] == 0x0D:  # CRLF
+        stop -= 1
+    if not buf.startswith(b"data:", start, stop):
+        return None
+    start += 5
+    if start < stop and buf[start] == 0x20:  # 規範上僅移除一個前導空白
+        start += 1
+    if start >= stop:
+        return None
+    return buf[start:stop]
+
+
+def _clean_usage(raw: Dict[str, Union[int, float, None]]) -> Dict[str, Union[int, float]]:
+    # 多數供應商的 usage 不含 None，直接沿用原 dict 免重建
+    if all(value is not None for value in raw.values()):
+        return raw  # type: ignore[return-value]
+    return {key: value for key, value in raw.items() if value is not None}
+
+
 class LLMProvider(str, Enum):
     OPENAI = "openai"
     GROK = "grok"
 
     @classmethod
+    @lru_cache(maxsize=16)
     def from_label(cls, label: str) -> "LLMProvider":
         normalized = (label or "").strip().lower()
         if normalized in {"grok", "gork", "xai"}:
@@ -37,6 +82,25 @@ class ProviderConfig:
 class LLMClient:
     def __init__(self, settings: Settings):
         self.settings = settings
+        self._http: Optional[httpx.AsyncClient] = None
+        # 串流時每個 token 都會用到，預先取出避免重複查詢 settings
+        self._console_enabled = settings.stream_console_enabled
+        self._console_threshold = max(20, settings.stream_buffer_chars)
+
+    def _http_client(self) -> httpx.AsyncClient:
+        # 共用連線池，避免每次呼叫 Grok 都重新建立 TCP/TLS 連線
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=self.settings.request_timeout,
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=16),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     async def generate_card(
         self,
@@ -87,7 +151,7 @@ class LLMClient:
         model = self._build_openai_model(config)
         chunks: List[str] = []
         usage: Dict[str, Union[int, float]] = {}
-        buffer = ""
+        buffer = io.StringIO()
         try:
             async for event in model.astream_events(messages, version="v1"):
                 if event["event"] == "on_chat_model_stream":
@@ -97,15 +161,11 @@ class LLMClient:
                         chunks.append(text)
                         if on_stream:
                             on_stream(text)
-                        buffer = self._stream_to_console(buffer, text)
+                        self._stream_to_console(buffer, text)
                 elif event["event"] == "on_chat_model_end":
                     output = event["data"]["output"]
                     if output.usage_metadata:
-                        usage = {
-                            key: value
-                            for key, value in output.usage_metadata.items()
-                            if value is not None
-                        }
+                        usage = _clean_usage(output.usage_metadata)
         except Exception as exc:  # noqa: BLE001
             logger.exception("OpenAI 呼叫失敗")
             raise ValueError(f"OpenAI 呼叫失敗: {exc}") from exc
@@ -131,50 +191,41 @@ class LLMClient:
             "stream": True,
         }
         chunks: List[str] = []
-        usage: Dict[str, Union[int, float]] = {}
-        buffer = ""
-
-        async with httpx.AsyncClient(timeout=self.settings.request_timeout) as client:
-            try:
-                async with client.stream("POST", url, json=payload, headers=headers) as response:
-                    if response.status_code >= 400:
-                        detail = await response.aread()
-                        raise ValueError(
-                            f"Grok API 錯誤 {response.status_code}: {detail.decode(errors='ignore')}"
-                        )
-                    async for line in response.aiter_lines():
-                        if not line or not line.startswith("data:"):
-                            continue
-                        data_str = line.split("data:", 1)[1].strip()
-                        if not data_str:
-                            continue
-                        if data_str == "[DONE]":
-                            break
-                        try:
-                            event = json.loads(data_str)
-                        except json.JSONDecodeError:
-                            continue
-                        delta = ""
-                        choices = event.get("choices") or []
-                        if choices:
-                            delta = choices[0].get("delta", {}).get("content") or ""
-                        if delta:
-                            chunks.append(delta)
+        last_usage: Optional[Dict[str, Union[int, float, None]]] = None
+        buffer = io.StringIO()
+
+        client = self._http_client()
+        try:
+            async with client.stream("POST", url, json=payload, headers=headers) as response:
+                if response.status_code >= 400:
+                    detail = await response.aread()
+                    raise ValueError(
+                        f"Grok API 錯誤 {response.status_code}: {detail.decode(errors='ignore')}"
+                    )
+                async for data in _iter_sse_data(response):
+                    try:
+                        event = orjson.loads(data)
+                    except orjson.JSONDecodeError:
+                        continue
+                    choices = event.get("choices")
+                    if choices:
+                        delta = choices[0].get("delta")
+                        text = delta.get("content") if delta else None
+                        if text:
+                            chunks.append(text)
                             if on_stream:
-                                on_stream(delta)
-                            buffer = self._stream_to_console(buffer, delta)
-                        if "usage" in event and event["usage"]:
-                            usage = {
-                                key: value
-                                for key, value in event["usage"].items()
-                                if value is not None
-                            }
-            except Exception as exc:  # noqa: BLE001
-                logger.exception("Grok API 呼叫失敗")
-                raise ValueError(f"Grok API 呼叫失敗: {exc}") from exc
-            finally:
-                self._flush_stream_buffer(buffer)
+                                on_stream(text)
+                            self._stream_to_console(buffer, text)
+                    event_usage = event.get("usage")
+                    if event_usage:
+                        last_usage = event_usage
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Grok API 呼叫失敗")
+            raise ValueError(f"Grok API 呼叫失敗: {exc}") from exc
+        finally:
+            self._flush_stream_buffer(buffer)
 
+        usage = _clean_usage(last_usage) if last_usage else {}
         return "".join(chunks), usage
 
     def _build_openai_model(self, config: ProviderConfig) -> ChatOpenAI:
@@ -213,16 +264,15 @@ class LLMClient:
             for part in content
         )
 
-    def _stream_to_console(self, buffer: str, text: str) -> str:
-        if not self.settings.stream_console_enabled:
-            return ""
-        buffer += text
-        threshold = max(20, self.settings.stream_buffer_chars)
-        if "\n" in buffer or len(buffer) >= threshold:
-            print(buffer, end="", flush=True)
-            return ""
-        return buffer
-
-    def _flush_stream_buffer(self, buffer: str) -> None:
-        if self.settings.stream_console_enabled and buffer:
-            print(buffer, flush=True)
+    def _stream_to_console(self, buffer: io.StringIO, text: str) -> None:
+        if not self._console_enabled:
+            return
+        buffer.write(text)
+        if "\n" in text or buffer.tell() >= self._console_threshold:
+            print(buffer.getvalue(), end="", flush=True)
+            buffer.seek(0)
+            buffer.truncate()
+
+    def _flush_stream_buffer(self, buffer: io.StringIO) -> None:
+        if self._console_enabled and buffer.tell():
+            print(buffer.getvalue(), flush=True)
@@ -1,10 +1,13 @@
 import asyncio
-import json
+import codecs
 import logging
 import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, AsyncIterator, Dict, Optional
 
+import orjson
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
@@ -13,14 +16,41 @@ from fastapi.staticfiles import StaticFiles
 from .config import get_settings
 from .job_manager import JobManager, JobStatus
 from .llm_client import LLMClient, LLMProvider
-from .png_utils import embed_ccv3_json, extract_ccv3_json, is_png_data
+from .png_utils import PNG_SIGNATURE, embed_ccv3_json, extract_ccv3_json, is_png_data
 from .utils import build_card_from_response, format_card_for_export
 
 settings = get_settings()
 llm_client = LLMClient(settings)
 job_manager = JobManager(keep_max=10)
+job_semaphore = asyncio.Semaphore(max(settings.max_concurrent_jobs, 1))
 logger = logging.getLogger(__name__)
 DEFAULT_CARD_IMAGE = Path(__file__).resolve().parent / "assets" / "default_card.png"
+UPLOAD_CHUNK_SIZE = 1 << 20
+STREAM_WAIT_TIMEOUT = 5.0
+STREAM_COALESCE_DELAY = 0.05
+PNG_OFFLOAD_THRESHOLD = 256 * 1024  # 超過此大小的 PNG 改在 thread 解析
+
+
+async def _read_upload_text(file: UploadFile, head: bytes = b"") -> str:
+    """分段讀取上傳檔並以增量解碼器轉為文字，避免整份 bytes 與 str 同時佔用記憶體。"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    parts = [decoder.decode(head)] if head else []
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+@lru_cache(maxsize=1)
+def _default_card_image() -> Optional[bytes]:
+    """預設底圖在各任務間相同，只讀取一次。"""
+    if not DEFAULT_CARD_IMAGE.exists():
+        return None
+    return DEFAULT_CARD_IMAGE.read_bytes()
+
+
+def _sse_message(event_id: int, payload: Dict[str, object]) -> str:
+    return f"id: {event_id}\ndata: {orjson.dumps(payload).decode()}\n\n"
 
 
 def _safe_filename(value: Optional[str]) -> str:
@@ -30,7 +60,15 @@ def _safe_filename(value: Optional[str]) -> str:
     cleaned = cleaned.strip("._-")
     return cleaned[:50] or "character"
 
-app = FastAPI(title="SillyTavern JSON 產生器", version="0.2.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    _default_card_image()
+    yield
+    await llm_client.aclose()
+
+
+app = FastAPI(title="SillyTavern JSON 產生器", version="0.2.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -42,21 +80,32 @@ FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
 if FRONTEND_DIR.exists():
     app.mount("/assets", StaticFiles(directory=str(FRONTEND_DIR)), name="assets")
 
+# 頁面是否存在只在啟動時檢查一次，每次請求不再 stat
+INDEX_PAGE = FRONTEND_DIR / "index.html"
+JOB_PAGE = FRONTEND_DIR / "job.html"
+INDEX_PAGE_EXISTS = INDEX_PAGE.exists()
+JOB_PAGE_EXISTS = JOB_PAGE.exists()
+PAGE_HEADERS = {
+    "Cache-Control": (
+        f"public, max-age={settings.frontend_cache_seconds}"
+        if settings.frontend_cache_seconds > 0
+        else "no-cache"
+    )
+}
+
 
 @app.get("/")
 async def read_index():
-    index_path = FRONTEND_DIR / "index.html"
-    if not index_path.exists():
+    if not INDEX_PAGE_EXISTS:
         return JSONResponse({"message": "前端尚未建立"}, status_code=404)
-    return FileResponse(index_path)
+    return FileResponse(INDEX_PAGE, headers=PAGE_HEADERS)
 
 
 @app.get("/job.html")
 async def read_job_page():
-    job_page = FRONTEND_DIR / "job.html"
-    if not job_page.exists():
+    if not JOB_PAGE_EXISTS:
         return JSONResponse({"message": "任務頁面尚未建立"}, status_code=404)
-    return FileResponse(job_page)
+    return FileResponse(JOB_PAGE, headers=PAGE_HEADERS)
 
 
 @app.get("/health")
@@ -72,11 +121,7 @@ async def generate_card(
 ):
     payload = input_text.strip()
     if file is not None:
-        file_bytes = await file.read()
-        try:
-            file_text = file_bytes.decode("utf-8")
-        except UnicodeDecodeError:
-            file_text = file_bytes.decode("utf-8", errors="ignore")
+        file_text = await _read_upload_text(file)
         if payload:
             payload = f"{payload}\n\n{file_text}"
         else:
@@ -103,6 +148,12 @@ async def generate_card(
 
 
 async def _process_job(job_id: str) -> None:
+    # 限制同時執行的任務數；排隊中的任務維持 pending，直到有空位
+    async with job_semaphore:
+        await _run_job(job_id)
+
+
+async def _run_job(job_id: str) -> None:
     try:
         meta = job_manager.mark_running(job_id)
     except Exception as exc:  # noqa: BLE001
@@ -122,15 +173,15 @@ async def _process_job(job_id: str) -> None:
         key_data = build_card_from_response(raw_output)
         export_payload = format_card_for_export(key_data)
         base_image = job_manager.read_base_image(job_id)
-        if base_image is None and DEFAULT_CARD_IMAGE.exists():
-            base_image = DEFAULT_CARD_IMAGE.read_bytes()
+        if base_image is None:
+            base_image = _default_card_image()
         png_bytes = None
         if base_image is not None:
             try:
-                png_bytes = embed_ccv3_json(base_image, export_payload)
+                png_bytes = await asyncio.to_thread(embed_ccv3_json, base_image, export_payload)
             except ValueError as exc:
                 logger.warning("嵌入 PNG 失敗 job=%s error=%s", job_id, exc)
-        job_manager.complete_job(job_id, raw_output, export_payload, usage, png_bytes=png_bytes)
+        await job_manager.complete_job(job_id, raw_output, export_payload, usage, png_bytes=png_bytes)
     except ValueError as exc:
         job_manager.fail_job(job_id, str(exc))
     except Exception as exc:  # noqa: BLE001
@@ -148,18 +199,21 @@ async def create_job(
     base_image_bytes: Optional[bytes] = None
     png_extract_error: Optional[str] = None
     if file is not None:
-        file_bytes = await file.read()
-        if is_png_data(file_bytes):
+        head = await file.read(len(PNG_SIGNATURE))
+        if is_png_data(head):
+            file_bytes = head + await file.read()
             base_image_bytes = file_bytes
-            extracted, png_extract_error = extract_ccv3_json(file_bytes, include_reason=True)
+            if len(file_bytes) > PNG_OFFLOAD_THRESHOLD:
+                extracted, png_extract_error = await asyncio.to_thread(
+                    extract_ccv3_json, file_bytes, include_reason=True
+                )
+            else:
+                extracted, png_extract_error = extract_ccv3_json(file_bytes, include_reason=True)
             if extracted:
                 payload = f"{payload}\n\n{extracted}" if payload else extracted
         else:
             png_extract_error = None
-            try:
-                file_text = file_bytes.decode("utf-8")
-            except UnicodeDecodeError:
-                file_text = file_bytes.decode("utf-8", errors="ignore")
+            file_text = await _read_upload_text(file, head)
             payload = f"{payload}\n\n{file_text}" if payload else file_text
 
     if not payload:
@@ -183,9 +237,9 @@ async def list_jobs():
 
 
 @app.get("/api/jobs/{job_id}")
-async def job_detail(job_id: str):
+async def job_detail(job_id: str, include_stream: bool = True):
     try:
-        detail = job_manager.get_job_detail(job_id)
+        detail = job_manager.get_job_detail(job_id, include_stream=include_stream)
     except FileNotFoundError as exc:
         raise HTTPException(status_code=404, detail="找不到指定任務") from exc
     return detail
@@ -240,41 +294,36 @@ async def stream_job(job_id: str, offset: int = 0) -> StreamingResponse:
 
     async def event_generator(start_offset: int) -> AsyncGenerator[str, None]:
         current_offset = max(start_offset, 0)
+        removed_payload = {"type": "status", "status": JobStatus.FAILED, "error": "任務已被移除"}
         while True:
+            # 先取得事件再讀取，yield 期間寫入的內容仍會設定此事件
+            stream_event = job_manager.stream_event(job_id)
             try:
                 chunk, next_offset = job_manager.read_stream_chunk(job_id, current_offset)
             except FileNotFoundError:
-                error_payload = json.dumps(
-                    {"type": "status", "status": JobStatus.FAILED, "error": "任務已被移除"},
-                    ensure_ascii=False,
-                )
-                yield f"id: {current_offset}\ndata: {error_payload}\n\n"
+                yield _sse_message(current_offset, removed_payload)
                 break
             if chunk:
                 current_offset = next_offset
-                payload = json.dumps({"type": "chunk", "content": chunk}, ensure_ascii=False)
-                yield f"id: {current_offset}\ndata: {payload}\n\n"
+                yield _sse_message(current_offset, {"type": "chunk", "content": chunk})
             try:
                 meta = job_manager.get_meta(job_id)
             except FileNotFoundError:
-                error_payload = json.dumps(
-                    {"type": "status", "status": JobStatus.FAILED, "error": "任務已被移除"},
-                    ensure_ascii=False,
-                )
-                yield f"id: {current_offset}\ndata: {error_payload}\n\n"
+                yield _sse_message(current_offset, removed_payload)
                 break
             if meta.status in {JobStatus.COMPLETED, JobStatus.FAILED}:
-                payload = json.dumps(
+                yield _sse_message(
+                    current_offset,
                     {
                         "type": "status",
                         "status": meta.status,
                         "error": meta.error,
                         "token_usage": meta.token_usage,
                     },
-                    ensure_ascii=False,
                 )
-                yield f"id: {current_offset}\ndata: {payload}\n\n"
                 break
-            await asyncio.sleep(0.5)
+            await job_manager.wait_for_stream(stream_event, timeout=STREAM_WAIT_TIMEOUT)
+            # 稍等片刻讓後續 token 累積，下一輪一次讀出並合併成單一 SSE frame
+            await asyncio.sleep(STREAM_COALESCE_DELAY)
 
     return StreamingResponse(event_generator(offset), media_type="text/event-stream")
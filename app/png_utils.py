@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-import base64
 import json
 import logging
+import struct
 import zlib
-from typing import Dict, Optional, Tuple, Union, overload
+from binascii import a2b_base64, b2a_base64
+from typing import Dict, List, Optional, Tuple, Union, overload
+
+import orjson
 
 PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 CHARACTER_CHUNK_KEYWORDS = (b"ccv3", b"chara")
+# 完整的 IEND chunk（長度 0 + 型別 + 固定 CRC）與 ccv3 tEXt chunk 的型別+關鍵字
+IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+CCV3_CHUNK_PREFIX = b"tEXtccv3\x00"
 logger = logging.getLogger(__name__)
 
 
@@ -39,77 +45,160 @@ def extract_ccv3_json(
 
 
 def _build_chunk(chunk_type: bytes, chunk_data: bytes) -> bytes:
-    length = len(chunk_data).to_bytes(4, "big")
-    crc = zlib.crc32(chunk_type + chunk_data) & 0xFFFFFFFF
-    return length + chunk_type + chunk_data + crc.to_bytes(4, "big")
+    crc = zlib.crc32(chunk_data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return b"".join((len(chunk_data).to_bytes(4, "big"), chunk_type, chunk_data, crc.to_bytes(4, "big")))
 
 
 def embed_ccv3_json(base_image: bytes, card_payload: Dict[str, object]) -> bytes:
     if not is_png_data(base_image):
         raise ValueError("提供的圖片不是有效的 PNG/APNG")
 
-    json_bytes = json.dumps(card_payload, ensure_ascii=False).encode("utf-8")
-    encoded = base64.b64encode(json_bytes)
+    try:
+        json_bytes = orjson.dumps(card_payload)
+    except orjson.JSONEncodeError:
+        # orjson 不支援超過 64 位元的整數（extensions 可能出現），退回標準庫
+        json_bytes = json.dumps(card_payload, ensure_ascii=False).encode("utf-8")
+    encoded = b2a_base64(json_bytes, newline=False)
     new_chunk = _build_chunk(b"tEXt", b"ccv3" + b"\x00" + encoded)
 
-    output = bytearray()
-    output.extend(base_image[: len(PNG_SIGNATURE)])
+    # 以 memoryview 切片避免複製 chunk 內容，最後一次 join 成輸出
+    mv = memoryview(base_image)
+    layout = _locate_embed_layout(base_image)
+    if layout is not None:
+        iend_start, ccv3_spans = layout
+        output: List[Union[bytes, memoryview]] = []
+        pos = 0
+        for span_start, span_end in ccv3_spans:
+            output.append(mv[pos:span_start])  # 略過舊的 ccv3 chunk
+            pos = span_end
+        output.extend((mv[pos:iend_start], new_chunk, mv[iend_start:]))
+        return b"".join(output)
+    return _embed_by_chunk_walk(mv, new_chunk)
+
+
+def _locate_embed_layout(data: bytes) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+    """以 bytes.find 找出 IEND 與既有 ccv3 chunk 的位置，免逐 chunk 掃描；找不到可信結果時回傳 None。"""
+    iend = data.find(IEND_CHUNK, len(PNG_SIGNATURE))
+    # 與逐 chunk 掃描一致插在第一個 IEND 前；IEND 後另有資料時交給逐 chunk 掃描
+    if iend == -1 or data.rfind(IEND_CHUNK) != iend:
+        return None
+    spans: List[Tuple[int, int]] = []
+    probe = data.find(CCV3_CHUNK_PREFIX, len(PNG_SIGNATURE) + 4, iend)
+    while probe != -1:
+        chunk_start = probe - 4
+        (length,) = struct.unpack_from(">I", data, chunk_start)
+        chunk_end = chunk_start + 12 + length
+        if length < len(CCV3_CHUNK_PREFIX) - 4 or chunk_end > iend:
+            return None
+        spans.append((chunk_start, chunk_end))
+        probe = data.find(CCV3_CHUNK_PREFIX, chunk_end + 4, iend)
+    return iend, spans
+
+
+def _embed_by_chunk_walk(mv: memoryview, new_chunk: bytes) -> bytes:
+    output: List[Union[bytes, memoryview]] = [mv[: len(PNG_SIGNATURE)]]
     pos = len(PNG_SIGNATURE)
-    total = len(base_image)
+    total = len(mv)
     inserted = False
 
     while pos + 8 <= total:
-        length = int.from_bytes(base_image[pos : pos + 4], "big")
-        chunk_type = base_image[pos + 4 : pos + 8]
+        (length,) = struct.unpack_from(">I", mv, pos)
+        chunk_type = mv[pos + 4 : pos + 8]
         chunk_start = pos
         chunk_end = pos + 8 + length + 4
-        chunk_bytes = base_image[chunk_start:chunk_end]
         pos = chunk_end
 
-        if chunk_type == b"tEXt":
-            chunk_data = base_image[chunk_start + 8 : chunk_start + 8 + length]
-            keyword = chunk_data.split(b"\x00", 1)[0]
-            if keyword == b"ccv3":
-                continue  # 移除舊資料
+        if chunk_type == b"tEXt" and mv[chunk_start + 8 : chunk_start + 13] == b"ccv3\x00":
+            continue  # 移除舊資料
 
         if chunk_type == b"IEND" and not inserted:
-            output.extend(new_chunk)
+            output.append(new_chunk)
             inserted = True
 
-        output.extend(chunk_bytes)
+        output.append(mv[chunk_start:chunk_end])
 
     if not inserted:
-        output.extend(new_chunk)
-    return bytes(output)
+        output.append(new_chunk)
+    return b"".join(output)
+
+
+def _find_text_chunk(data: bytes, keyword: bytes, limit: int) -> Optional[Tuple[int, int]]:
+    """以 bytes.find 在 limit 之前搜尋關鍵字，驗證為 tEXt chunk 後回傳文字內容範圍。"""
+    needle = keyword + b"\x00"
+    probe = data.find(needle, len(PNG_SIGNATURE) + 8, limit)
+    while probe != -1:
+        header_pos = probe - 8
+        if data[header_pos + 4 : probe] == b"tEXt":
+            (length,) = struct.unpack_from(">I", data, header_pos)
+            end = probe + length
+            if len(needle) <= length and end <= limit:
+                return probe + len(needle), end
+        probe = data.find(needle, probe + 1, limit)
+    return None
+
+
+def _has_keyword_variant(data: bytes, stop: int) -> bool:
+    """stop 之前是否有關鍵字大小寫不同（如 Chara）的 tEXt chunk，有則須交給逐 chunk 掃描。"""
+    probe = data.find(b"tEXt", len(PNG_SIGNATURE) + 4, stop)
+    while probe != -1:
+        head = data[probe + 4 : probe + 10]
+        nul = head.find(b"\x00")
+        if nul != -1 and head[:nul].lower() in CHARACTER_CHUNK_KEYWORDS:
+            return True
+        probe = data.find(b"tEXt", probe + 4, stop)
+    return False
+
+
+def _decode_character_text(keyword: bytes, raw_text: bytes) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        decoded = a2b_base64(raw_text)
+        return decoded.decode("utf-8"), None
+    except Exception as exc:  # noqa: BLE001
+        keyword_str = keyword.decode("latin1", errors="ignore") or "ccv3/chara"
+        return None, f"無法解碼 PNG 內的 {keyword_str} chunk：{exc}"
 
 
 def _extract_ccv3_payload(data: bytes) -> Tuple[Optional[str], Optional[str]]:
     if not is_png_data(data):
         return None, "提供的檔案不是有效的 PNG/APNG"
 
+    # 快速路徑：在第一個 IEND 之前直接搜尋關鍵字，取最先出現者；
+    # 若其前方還有大小寫不同的關鍵字，結果可能與逐 chunk 掃描不同，改走下方掃描
+    limit = data.find(IEND_CHUNK, len(PNG_SIGNATURE))
+    if limit == -1:
+        limit = len(data)
+    hits = []
+    for keyword in CHARACTER_CHUNK_KEYWORDS:
+        span = _find_text_chunk(data, keyword, limit)
+        if span is not None:
+            hits.append((span, keyword))
+    if hits:
+        (start, end), keyword = min(hits)
+        if not _has_keyword_variant(data, start - len(keyword) - 5):
+            return _decode_character_text(keyword, data[start:end])
+
+    # 找不到或有大小寫不同的關鍵字時，退回逐 chunk 掃描
+    mv = memoryview(data)
     pos = len(PNG_SIGNATURE)
-    total = len(data)
+    total = len(mv)
     while pos + 8 <= total:
-        length = int.from_bytes(data[pos : pos + 4], "big")
-        chunk_type = data[pos + 4 : pos + 8]
+        (length,) = struct.unpack_from(">I", mv, pos)
+        chunk_type = mv[pos + 4 : pos + 8]
         pos += 8
-        chunk_data = data[pos : pos + length]
+        chunk_data = mv[pos : pos + length]
         pos += length
         pos += 4  # skip CRC
 
         if chunk_type == b"tEXt":
-            parts = chunk_data.split(b"\x00", 1)
-            if len(parts) != 2:
+            # 只檢查前 6 bytes 內的關鍵字，不切割整個 chunk
+            head = chunk_data[:6].tobytes()
+            nul = head.find(b"\x00")
+            if nul == -1:
                 continue
-            keyword, raw_text = parts
+            keyword = head[:nul]
             if keyword.lower() not in CHARACTER_CHUNK_KEYWORDS:
                 continue
-            try:
-                decoded = base64.b64decode(raw_text)
-                return decoded.decode("utf-8"), None
-            except Exception as exc:  # noqa: BLE001
-                keyword_str = keyword.decode("latin1", errors="ignore") or "ccv3/chara"
-                return None, f"無法解碼 PNG 內的 {keyword_str} chunk：{exc}"
+            return _decode_character_text(keyword, chunk_data[nul + 1 :])
 
         if chunk_type == b"IEND":
             break
@@ -32,10 +32,13 @@ Lorebook.entries 需要 { keys: string[], content: string, enabled: boolean, ins
 """
 
 
+SYSTEM_PROMPT = CARD_EDITOR_INSTRUCTIONS + KEY_OUTPUT_SCHEMA
+USER_PROMPT_PREFIX = "以下為原始資料，請整理：\n"
+
+
 def build_system_prompt() -> str:
-    return CARD_EDITOR_INSTRUCTIONS + KEY_OUTPUT_SCHEMA
+    return SYSTEM_PROMPT
 
 
 def build_user_prompt(raw_payload: str) -> str:
-    payload = raw_payload.strip()
-    return f"以下為原始資料，請整理：\n{payload}"
+    return USER_PROMPT_PREFIX + raw_payload.strip()
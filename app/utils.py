@@ -1,14 +1,10 @@
-import json
-import re
-from datetime import datetime
-from typing import Any
+import time
 
 from pydantic import ValidationError
 
 from .models import CharacterCore
 
-CODE_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
-JSON_OBJECT_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+CODE_FENCE = "```"
 DEFAULT_SPEC = "chara_card_v3"
 DEFAULT_SPEC_VERSION = "3.0"
 
@@ -18,63 +14,68 @@ def extract_json_from_text(raw: str) -> str:
     嘗試從 LLM 回傳的文字中抓出第一段 JSON。
     """
     text = raw.strip()
-    fence_match = CODE_FENCE_PATTERN.search(text)
-    if fence_match:
-        return fence_match.group(1).strip()
-
-    brace_match = JSON_OBJECT_PATTERN.search(text)
-    if brace_match:
-        return brace_match.group(0).strip()
+    fence_start = text.find(CODE_FENCE)
+    if fence_start != -1:
+        body_start = fence_start + len(CODE_FENCE)
+        if text[body_start : body_start + 4].lower() == "json":
+            body_start += 4
+        fence_end = text.find(CODE_FENCE, body_start)
+        if fence_end != -1:
+            return text[body_start:fence_end].strip()
+
+    # 第一個 { 到最後一個 }，與貪婪比對 \{.*\} 結果相同，但全程在 C 層搜尋
+    brace_start = text.find("{")
+    if brace_start != -1:
+        brace_end = text.rfind("}")
+        if brace_end > brace_start:
+            return text[brace_start : brace_end + 1].strip()
 
     return text
 
 
 def build_card_from_response(raw_content: str) -> CharacterCore:
     json_payload = extract_json_from_text(raw_content)
+    # 直接交給 pydantic-core 解析 JSON 並驗證，省去中間的 dict
     try:
-        parsed: Any = json.loads(json_payload)
-    except json.JSONDecodeError as exc:
-        raise ValueError("LLM 回傳內容不是有效的 JSON") from exc
-
-    try:
-        return CharacterCore.model_validate(parsed)
+        return CharacterCore.model_validate_json(json_payload)
     except ValidationError as exc:
+        if any(error["type"] == "json_invalid" for error in exc.errors()):
+            raise ValueError("LLM 回傳內容不是有效的 JSON") from exc
         raise ValueError(f"關鍵欄位格式不正確: {exc}") from exc
 
 
-def _clean_dict(payload: dict) -> dict:
-    return {k: v for k, v in payload.items() if v is not None}
-
-
 def format_card_for_export(core: CharacterCore) -> dict:
     """依照 SillyTavern 實際匯入的 JSON 範本輸出。"""
-    ts = datetime.utcnow()
-    ms = int(ts.microsecond / 1000)
-    timestamp = f"{ts:%Y-%m-%d @%Hh %Mm %Ss} {ms:03d}ms"
+    now = time.time()
+    ms = int((now % 1) * 1000)
+    timestamp = f"{time.strftime('%Y-%m-%d @%Hh %Mm %Ss', time.gmtime(now))} {ms:03d}ms"
     character_book = (
         core.character_book.model_dump() if core.character_book is not None else None
     )
-    data = _clean_dict(
-        {
-            "name": core.name,
-            "description": core.description,
-            "personality": core.personality,
-            "scenario": core.scenario,
-            "first_mes": core.first_mes,
-            "mes_example": core.mes_example,
-            "creator_notes": core.creator_notes,
-            "system_prompt": core.system_prompt,
-            "post_history_instructions": core.post_history_instructions,
-            "alternate_greetings": core.alternate_greetings,
-            "character_book": character_book,
-            "tags": core.tags,
-            "creator": core.creator,
-            "character_version": core.character_version,
-            "extensions": core.extensions,
-        }
-    )
+    tags = core.tags
+    data = {
+        key: value
+        for key, value in (
+            ("name", core.name),
+            ("description", core.description),
+            ("personality", core.personality),
+            ("scenario", core.scenario),
+            ("first_mes", core.first_mes),
+            ("mes_example", core.mes_example),
+            ("creator_notes", core.creator_notes),
+            ("system_prompt", core.system_prompt),
+            ("post_history_instructions", core.post_history_instructions),
+            ("alternate_greetings", core.alternate_greetings),
+            ("character_book", character_book),
+            ("tags", tags),
+            ("creator", core.creator),
+            ("character_version", core.character_version),
+            ("extensions", core.extensions),
+        )
+        if value is not None
+    }
 
-    export_payload = {
+    return {
         "name": core.name,
         "description": core.description,
         "personality": core.personality,
@@ -89,7 +90,5 @@ def format_card_for_export(core: CharacterCore) -> dict:
         "spec": DEFAULT_SPEC,
         "spec_version": DEFAULT_SPEC_VERSION,
         "data": data,
-        "tags": core.tags,
+        "tags": tags,
     }
-
-    return export_payload